@@ -14,10 +14,18 @@ If input_folder is not provided, the default (DEFAULT_SOURCE_DIR) is used.
 """
 
 import os
+import re
 import sys
 import shutil
+import string
+import xml.parsers.expat
 import base64
-from typing import Dict, Set, List
+import binascii
+import io
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Set, List, Iterable, Iterator, Tuple
 
 # ==========================
 # KONFIGURACIJA
@@ -26,6 +34,15 @@ from typing import Dict, Set, List
 # Privzeta vhodna mapa, če ne podamo parametra
 DEFAULT_SOURCE_DIR = r"c:\test"
 
+# Število procesov za vzporedno obdelavo (None = os.cpu_count(), 1 = brez vzporednosti)
+PARALLEL_WORKERS: int | None = None
+
+# Koliko datotek naenkrat pošljemo v obdelavo enemu procesu
+PARALLEL_BATCH_SIZE = 64
+
+# Velikost kosa pri branju datotek za štetje vrstic
+COUNT_CHUNK_SIZE = 1 << 20
+
 # Tag-i, ki so nam (zaenkrat) zanimivi za izvoz iz XML (npr. LotusScript, raw objekti)
 INTERESTING_XML_TAGS: Set[str] = {
     "lotusscript",
@@ -99,9 +116,16 @@ ZNANE_XML_DATOTEKE: Set[str] = {
 # POMOŽNE FUNKCIJE – FILE SYSTEM
 # ==========================
 
+# mape, ki smo jih v tem procesu že ustvarili (da ne kličemo makedirs za vsako datoteko)
+_ENSURED_DIRS: Set[str] = set()
+
+
 def ensure_dir(path: str) -> None:
     """Poskrbi, da mapa obstaja."""
+    if path in _ENSURED_DIRS:
+        return
     os.makedirs(path, exist_ok=True)
+    _ENSURED_DIRS.add(path)
 
 
 def build_export_root(source_root: str) -> str:
@@ -111,11 +135,25 @@ def build_export_root(source_root: str) -> str:
     return source_root_clean + "-export"
 
 
-def get_rel_path(base: str, full: str) -> str:
-    """Vrne relativno pot `full` glede na `base`."""
-    rel = os.path.relpath(full, base)
-    # če smo v korenu, vrne "."
-    return rel
+def iter_tree_files(root: str, rel_dir: str = "") -> Iterator[Tuple[str, os.DirEntry]]:
+    """
+    Rekurzivno gre čez `root` z os.scandir in vrača pare (rel_dir, DirEntry)
+    za vse datoteke. DirEntry ima stat podatke že v cache-u, tako da
+    ne kličemo še dodatnih os.path.isfile / os.stat.
+    """
+    try:
+        with os.scandir(os.path.join(root, rel_dir)) as it:
+            entries = list(it)
+    except OSError:
+        return
+
+    for entry in entries:
+        if entry.is_dir():
+            # enako kot os.walk: v symlinkane mape ne gremo
+            if not entry.is_symlink():
+                yield from iter_tree_files(root, os.path.join(rel_dir, entry.name))
+        else:
+            yield rel_dir, entry
 
 
 def copy_file(src: str, dst: str) -> None:
@@ -128,10 +166,9 @@ def copy_file(src: str, dst: str) -> None:
 # IGNORIRANJE PO KONČNICI / HEADERJU
 # ==========================
 
-def should_skip_by_extension(path: str) -> bool:
-    """Preveri, ali datoteko ignoriramo glede na končnico."""
-    _, ext = os.path.splitext(path)
-    return ext.lower() in IGNORE_EXTENSIONS
+def should_skip_by_extension(ext: str) -> bool:
+    """Preveri, ali datoteko ignoriramo glede na končnico (`ext` je že v malih črkah)."""
+    return ext in IGNORE_EXTENSIONS
 
 
 def read_header(path: str, length: int = 32) -> bytes:
@@ -143,47 +180,43 @@ def read_header(path: str, length: int = 32) -> bytes:
         return b""
 
 
-def starts_with_any(data: bytes, prefixes: List[bytes]) -> bool:
-    """Vrne True, če `data` začne s katerimkoli prefixom."""
-    for p in prefixes:
-        if data.startswith(p):
-            return True
-    return False
+# magic prefixi, razvrščeni po prvem bajtu: prvi bajt headerja takoj izloči
+# vse prefixe, ki ne pridejo v poštev (ne glede na to, koliko jih je)
+_MAGIC_BY_FIRST_BYTE: Dict[int, Tuple[bytes, ...]] = {}
+for _prefix in IGNORE_MAGIC_PREFIXES:
+    _MAGIC_BY_FIRST_BYTE[_prefix[0]] = _MAGIC_BY_FIRST_BYTE.get(_prefix[0], ()) + (_prefix,)
+del _prefix
+# koliko bajtov preberemo za header: dovolj za magic prefixe in za XML detekcijo
+HEADER_LENGTH = max(128, *(len(p) for p in IGNORE_MAGIC_PREFIXES))
 
 
-def should_skip_by_header(path: str) -> bool:
-    """Preveri, ali datoteko ignoriramo glede na magic header."""
-    header = read_header(path, length=max(len(x) for x in IGNORE_MAGIC_PREFIXES))
+def should_skip_by_header(header: bytes) -> bool:
+    """Preveri, ali datoteko ignoriramo glede na magic header (prvi bajti datoteke)."""
     if not header:
         return False
-    return starts_with_any(header, IGNORE_MAGIC_PREFIXES)
+    candidates = _MAGIC_BY_FIRST_BYTE.get(header[0])
+    return candidates is not None and header.startswith(candidates)
 
 
 # ==========================
 # XML POMOČNIKI
 # ==========================
 
-def is_probably_xml(path: str) -> bool:
+def is_probably_xml(header: bytes) -> bool:
     """
-    Zelo enostavna detekcija, ali je datoteka verjetno XML:
-    - po končnici (.xml, .dxl, .form, .column, ...)
-    - ali pa če se začne z '<?xml' oziroma '<'
+    Zelo enostavna detekcija, ali je datoteka verjetno XML
+    (za datoteke z neznano končnico): ali se začne z '<?xml' oziroma '<'.
     """
-    _, ext = os.path.splitext(path)
-    if ext.lower() in ZNANE_XML_DATOTEKE:
-        return True
-
-    try:
-        with open(path, "rb") as f:
-            head = f.read(128)
-        text = head.decode("utf-8", errors="ignore").lstrip()
-        return text.startswith("<?xml") or text.startswith("<")
-    except OSError:
-        return False
+    text = header.decode("utf-8", errors="ignore").lstrip()
+    return text.startswith("<")
 
 
 def load_xml_text(path: str) -> str:
-    """Prebere datoteko kot tekst (utf-8 z rezervno varianto)."""
+    """
+    Prebere datoteko kot tekst (utf-8 z rezervno varianto). Tekst se uporabi
+    za ponovni parse DXL, ki ni veljaven UTF-8 (npr. cp1250 'è' v kodi), zato
+    latin1 ohrani znake namesto U+FFFD.
+    """
     with open(path, "rb") as f:
         data = f.read()
     try:
@@ -192,6 +225,7 @@ def load_xml_text(path: str) -> str:
         return data.decode("latin1", errors="replace")
 
 
+@lru_cache(maxsize=1024)
 def get_local_tag(tag: str) -> str:
     """
     Iz XML tag-a odstrani namespace, npr:
@@ -202,47 +236,105 @@ def get_local_tag(tag: str) -> str:
     return tag
 
 
+@lru_cache(maxsize=1024)
 def is_blocked_tag(local_tag: str, ext: str) -> bool:
     """
     Ali je tag blokiran glede na globalno in per-ekstenzija nastavitve.
+    `ext` mora biti že v malih črkah. Imen tagov je malo, zato rezultate cache-amo.
     """
     if local_tag in GLOBAL_BLOCKED_TAGS:
         return True
-    extra = PER_EXTENSION_BLOCKED_TAGS.get(ext.lower(), set())
+    extra = PER_EXTENSION_BLOCKED_TAGS.get(ext, set())
     if local_tag in extra:
         return True
     return False
 
 
-def is_empty_line(text: str) -> bool:
-    """Vrne True, če je vrstica prazna ali vsebuje samo presledke, tabulatorje ali newline znake."""
-    return text.strip() == ""
+# vsi ločilniki vrstic, ki jih pozna str.splitlines()
+_LINE_BREAK_RE = re.compile("\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+# vrstica, ki vsebuje samo whitespace (skupaj z njenim \n)
+_EMPTY_LINE_RE = re.compile(r"^[^\S\n]*(?:\n|\Z)", re.MULTILINE)
 
 
 def remove_empty_lines_normalized(text: str) -> str:
-    return "\n".join(
-        line for line in text.splitlines()
-        if not is_empty_line(line)
-    )
+    """
+    Odstrani prazne vrstice (tudi tiste s samimi presledki/tabulatorji)
+    in normalizira konce vrstic na '\n' – brez zaključnega '\n'.
+    """
+    text = _EMPTY_LINE_RE.sub("", _LINE_BREAK_RE.sub("\n", text))
+    return text[:-1] if text.endswith("\n") else text
+
+
+# enako kot zgoraj, le da delamo direktno nad bajti – samo za čisti ASCII,
+# ker ne-ASCII whitespace (NBSP, U+3000, ...) in ločil (U+0085, U+2028, ...) ne pozna
+_LINE_BREAK_BYTES_RE = re.compile(b"\r\n|[\n\r\v\f\x1c\x1d\x1e]")
+_EMPTY_LINE_BYTES_RE = re.compile(rb"^[ \t\x1f]*(?:\n|\Z)", re.MULTILINE)
+
+
+def remove_empty_lines_bytes(data: bytes) -> bytes:
+    """
+    Kot remove_empty_lines_normalized, vendar nad surovimi bajti.
+    Čisti ASCII (običajna LotusScript koda) obdelamo brez dekodiranja v str;
+    ostalo dekodiramo (utf-8, sicer latin1), očistimo kot str in zapišemo
+    kot utf-8, enako kot prej pri pisanju v tekstovnem načinu.
+    """
+    if not data.isascii():
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            text = data.decode("latin1")
+        return remove_empty_lines_normalized(text).encode("utf-8")
+
+    data = _EMPTY_LINE_BYTES_RE.sub(b"", _LINE_BREAK_BYTES_RE.sub(b"\n", data))
+    return data[:-1] if data.endswith(b"\n") else data
 
 
 # --- NOVO: dekodiranje rawitemdata (base64) in odločanje, ali je tekst ali binarno ---
 
+# ASCII znaki, ki jih str.split() šteje za whitespace
+_ASCII_WHITESPACE = b" \t\n\v\f\r\x1c\x1d\x1e\x1f"
+
+# tabela za bytes.translate: 1 = ne-tiskljiv bajt (0-8, 14-31), 0 = OK
+_NON_TEXT_TABLE = bytes(1 if (b < 9 or 14 <= b < 32) else 0 for b in range(256))
+
+# vsi znaki, ki jih str.split() šteje za whitespace (najvišji je U+3000)
+_ALL_WHITESPACE = "".join(chr(c) for c in range(0x3001) if chr(c).isspace())
+
+# znaki, ki se lahko pojavijo v base64 rawitemdata (skupaj z whitespace)
+_B64_CHARS = frozenset(string.ascii_letters + string.digits + "+/=" + _ALL_WHITESPACE)
+# koliko začetnih znakov preverimo, preden se lotimo celotnega bloka
+_B64_SNIFF_LENGTH = 32
+
+
 def decode_rawitemdata_base64(raw: str) -> str | None:
     """
     Poskusi base64-dekodirati rawitemdata.
     Če rezultat deluje kot tekst (koda), vrne string.
     Če gre za binarne podatke ali dekodiranje ne uspe, vrne None.
     """
-    # odstrani whitespace (newline, presledki, ...)
-    clean = "".join(raw.split())
+    # hitra zavrnitev: prekratko ali začetek očitno ni base64
+    if len(raw) < 4 or not _B64_CHARS.issuperset(raw[:_B64_SNIFF_LENGTH]):
+        return None
+
+    # ne-ASCII whitespace (NBSP, ...) odstranimo že na str, kot str.split()
+    if not raw.isascii():
+        raw = "".join(raw.split())
+
+    # base64 je čisti ASCII – vse ostalo takoj zavrnemo
+    try:
+        data = raw.encode("ascii")
+    except UnicodeEncodeError:
+        return None
+
+    # odstrani whitespace (newline, presledki, ...) v enem C prehodu
+    clean = data.translate(None, _ASCII_WHITESPACE)
     if not clean:
         return None
 
     # poskus dekodiranja base64
     try:
         decoded = base64.b64decode(clean, validate=True)
-    except Exception:
+    except binascii.Error:
         return None
 
     if not decoded:
@@ -251,14 +343,7 @@ def decode_rawitemdata_base64(raw: str) -> str | None:
     # Heuristika: če je preveč ne-tiskljivih znakov ali null byte-ov, tretiramo kot binarno
     head = decoded[:64]
     if head:
-        non_text = 0
-        for b in head:
-            if b == 0:
-                non_text += 1
-            elif b < 9:
-                non_text += 1
-            elif 14 <= b < 32:
-                non_text += 1
+        non_text = head.translate(_NON_TEXT_TABLE).count(1)
         ratio = non_text / len(head)
         if ratio > 0.30:
             return None
@@ -277,60 +362,285 @@ def decode_rawitemdata_base64(raw: str) -> str | None:
     return txt
 
 
-def extract_interesting_xml_fragments(xml_text: str, file_ext: str, stats: Dict[str, int]) -> str:
+# --- hitra pot: zanimive tage poiščemo z regexi direktno v bajtih ---
+
+# odpiralni tag enega izmed zanimivih tagov (brez namespace prefixa);
+# vrednosti atributov so v narekovajih in lahko vsebujejo tudi '>'
+_INTERESTING_OPEN_RE = re.compile(
+    b"<("
+    + b"|".join(re.escape(t.encode("ascii")) for t in sorted(INTERESTING_XML_TAGS))
+    + rb""")(?=[\s/>])((?:[^>"']|"[^"]*"|'[^']*')*)>"""
+)
+_XML_ENCODING_RE = re.compile(rb"\A(?:\xef\xbb\xbf)?\s*<\?xml[^>]*?encoding\s*=\s*[\"']([^\"']*)")
+_XML_ENTITY_RE = re.compile(r"&(?:#([0-9]+)|#x([0-9a-fA-F]+)|(lt|gt|amp|quot|apos));")
+_XML_NAMED_ENTITY_CHECK_RE = re.compile(r"&(?!(?:lt|gt|amp|quot|apos);)")
+_XML_NAMED_ENTITIES = {"lt": "<", "gt": ">", "amp": "&", "quot": '"', "apos": "'"}
+
+
+class _NeedsFullParser(Exception):
+    """Hitra pot tega dokumenta ne zna obdelati – uporabimo ElementTree."""
+
+
+def _reject_xml(*args) -> None:
+    raise _NeedsFullParser
+
+
+def _reject_doctype(name: str, system_id: str | None, public_id: str | None,
+                    has_internal_subset: int) -> None:
+    # navaden DXL ima samo <!DOCTYPE form SYSTEM '...dtd'>; interni subset
+    # ali '<' v literalih pa prepustimo ElementTree
+    if has_internal_subset or "<" in (system_id or "") + (public_id or ""):
+        raise _NeedsFullParser
+
+
+def _reject_prefixed_namespace(prefix: str | None, uri: str) -> None:
+    if prefix:
+        raise _NeedsFullParser
+
+
+def _check_xml_for_fast_path(data: bytes) -> bool:
+    """
+    Z expat (isti parser, kot ga uporablja ElementTree) preveri, ali je dokument
+    veljaven XML, ki ga hitra pot zna obdelati. Handlerji so nastavljeni samo
+    za redke stvari (komentarji, CDATA, processing instructions, DOCTYPE z
+    internim subsetom, neznane entitete, namespace prefixi), zato za navadne
+    elemente ne nastane noben Python objekt.
+    """
+    parser = xml.parsers.expat.ParserCreate(namespace_separator="}")
+    parser.CommentHandler = _reject_xml
+    parser.StartCdataSectionHandler = _reject_xml
+    parser.ProcessingInstructionHandler = _reject_xml
+    parser.StartDoctypeDeclHandler = _reject_doctype
+    parser.SkippedEntityHandler = _reject_xml
+    parser.StartNamespaceDeclHandler = _reject_prefixed_namespace
+    try:
+        parser.Parse(data, True)
+    except (xml.parsers.expat.ExpatError, LookupError, _NeedsFullParser):
+        return False
+    return True
+
+
+def _is_xml_char(cp: int) -> bool:
+    """Ali je koda dovoljen znak v XML (produkcija Char iz XML 1.0)."""
+    return (
+        cp in (0x9, 0xA, 0xD)
+        or 0x20 <= cp <= 0xD7FF
+        or 0xE000 <= cp <= 0xFFFD
+        or 0x10000 <= cp <= 0x10FFFF
+    )
+
+
+def _unescape_xml_text(text: str) -> str | None:
+    """
+    Razreši XML entitete (&lt;, &#13;, &#x41;, ...) v tekstu.
+    Vrne None, če naleti na neznano entiteto, samostojen '&' ali
+    referenco na znak, ki v XML ni dovoljen (&#0;, &#x110000;, ...).
+    """
+    if "&#" not in text:
+        # samo poimenovane entitete: zamenjamo kar z replace (&amp; na koncu)
+        if _XML_NAMED_ENTITY_CHECK_RE.search(text):
+            return None
+        return (
+            text.replace("&lt;", "<").replace("&gt;", ">")
+            .replace("&quot;", '"').replace("&apos;", "'").replace("&amp;", "&")
+        )
+
+    parts: List[str] = []
+    pos = 0
+    for m in _XML_ENTITY_RE.finditer(text):
+        if "&" in text[pos:m.start()]:
+            return None
+        dec, hexa, name = m.groups()
+        if name:
+            parts.append(text[pos:m.start()] + _XML_NAMED_ENTITIES[name])
+        else:
+            digits = (dec or hexa).lstrip("0")
+            if len(digits) > 7:
+                return None  # preveliko za katerikoli znak (in za chr())
+            cp = int(digits or "0", 10 if dec else 16)
+            if not _is_xml_char(cp):
+                return None
+            parts.append(text[pos:m.start()] + chr(cp))
+        pos = m.end()
+    if "&" in text[pos:]:
+        return None
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def scan_interesting_xml_fragments(data: bytes) -> List[Tuple[str, str]] | None:
+    """
+    Hitra pot brez XML parserja: v surovih bajtih poišče zanimive tage
+    (INTERESTING_XML_TAGS) in vrne seznam (tag, tekst) v vrstnem redu v datoteki.
+    Deluje za običajen DXL (UTF-8, tagi brez prefixa, samo tekst v tagu).
+    Če naleti na karkoli drugega (komentarji, CDATA, prefixi, neznane entitete,
+    drug encoding, gnezdeni elementi ...), vrne None in uporabimo ElementTree.
+
+    Veljavnost dokumenta najprej preveri _check_xml_for_fast_path, tako da
+    okrnjen ali pokvarjen DXL še vedno pristane v "vrnemo original".
+    """
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")) or b"\x00" in data[:4]:
+        return None  # UTF-16/32 (z BOM ali brez) – regexi delajo samo za ASCII
+    m = _XML_ENCODING_RE.match(data)
+    if m and m.group(1).lower() not in (b"utf-8", b"utf8"):
+        return None
+    if not _check_xml_for_fast_path(data):
+        return None
+
+    fragments: List[Tuple[str, str]] = []
+    for m in _INTERESTING_OPEN_RE.finditer(data):
+        tag, attrs = m.group(1), m.group(2)
+        if attrs.endswith(b"/"):
+            continue  # <formula/> – brez teksta
+
+        body_end = data.find(b"</" + tag, m.end())
+        if body_end < 0:
+            return None
+        body = data[m.end():body_end]
+        if b"<" in body:
+            return None
+
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+        if "&" in text:
+            text = _unescape_xml_text(text)
+            if text is None:
+                return None
+
+        fragments.append((tag.decode("ascii"), text))
+
+    return fragments
+
+
+def iter_interesting_xml_fragments(source: str | io.StringIO) -> Iterator[Tuple[str, str]]:
+    """
+    XML (pot do datoteke ali že dekodiran tekst v StringIO) beremo sproti
+    z ElementTree.iterparse in vračamo (tag, tekst) za zanimive tage v vrstnem
+    redu odpiralnih tagov (kot rekurzivni sprehod po drevesu). Obdelane
+    elemente sproti brišemo, da celotno drevo nikoli ni v spominu.
+    Ob neveljavnem XML vrže ET.ParseError, ob neznanem encodingu
+    v deklaraciji pa LookupError.
+    """
+    import xml.etree.ElementTree as ET
+
+    # gnezdeni zanimivi tagi se zaključijo pred staršem, zato jih zadržimo,
+    # dokler se ne zaključi najbolj zunanji
+    pending: List[Tuple[str, str]] = []
+    open_idx: List[int] = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        local = get_local_tag(elem.tag)
+        if event == "start":
+            if local in INTERESTING_XML_TAGS:
+                open_idx.append(len(pending))
+                pending.append((local, ""))
+            continue
+        if local in INTERESTING_XML_TAGS:
+            pending[open_idx.pop()] = (local, elem.text or "")
+            if not open_idx:
+                yield from pending
+                pending.clear()
+        # element je obdelan (vsi otroci so že prišli pred njim)
+        elem.clear()
+
+
+# --- obdelava teksta posameznega zanimivega taga ---
+
+def _handle_code_text(text: str, lines: List[str], found: array) -> str:
+    """Navaden tekst taga (lotusscript, formula, ...): očisti prazne vrstice."""
+    text = text.strip()
+    if text:
+        cleaned = remove_empty_lines_normalized(text)
+        if cleaned:
+            lines.append(cleaned)
+            return cleaned
+    return ""
+
+
+def _handle_java(text: str, lines: List[str], found: array) -> str:
+    """<java>: kot navaden tekst, dodatno preštejemo vrstice po čiščenju."""
+    cleaned = _handle_code_text(text, lines, found)
+    if cleaned:
+        # cleaned nima praznih vrstic in ločila so samo '\n'
+        found[S_JAVA_LINES] += cleaned.count("\n") + 1
+    return cleaned
+
+
+def _handle_rawitemdata(text: str, lines: List[str], found: array) -> str:
+    """<rawitemdata>: base64 dekodiramo in obdržimo samo, če je rezultat tekst."""
+    raw = text.strip()
+    if not raw:
+        return ""
+    decoded = decode_rawitemdata_base64(raw)
+    if decoded is None:
+        # binarno ali neuspešno – ne dodamo nič v lines
+        found[S_RAW_BIN] += 1
+        return ""
+    found[S_RAW_TXT] += 1
+    cleaned = remove_empty_lines_normalized(decoded)
+    lines.append(cleaned)
+    return cleaned
+
+
+# za vsak zanimiv tag vnaprej izberemo funkcijo, ki obdela njegov tekst
+_SPECIAL_TAG_HANDLERS = {
+    "rawitemdata": _handle_rawitemdata,
+    "java": _handle_java,
+}
+_TAG_HANDLERS = {
+    tag: _SPECIAL_TAG_HANDLERS.get(tag, _handle_code_text)
+    for tag in INTERESTING_XML_TAGS
+}
+
+
+def collect_xml_fragments(
+    fragments: Iterable[Tuple[str, str]], file_ext: str
+) -> Tuple[List[str], array]:
+    """
+    Obdela (tag, tekst) pare: preskoči blokirane tage, ostale obdela z
+    ustreznim handlerjem. Vrne očiščene delčke in lokalno statistiko
+    (ta se prišteje šele, ko je XML v celoti prebran).
+    """
+    lines: List[str] = []
+    found = init_stats()
+    for local, text in fragments:
+        # samo, če tag NI blokiran
+        if not is_blocked_tag(local, file_ext):
+            _TAG_HANDLERS[local](text, lines, found)
+    return lines, found
+
+
+def extract_interesting_xml_fragments(src: str, file_ext: str, stats: array) -> str:
     """
-    Iz XML teksta izlušči samo 'zanimive' fragmente (INTERESTING_XML_TAGS),
+    Iz XML datoteke izlušči samo 'zanimive' fragmente (INTERESTING_XML_TAGS),
     pri čemer upošteva GLOBAL_BLOCKED_TAGS in PER_EXTENSION_BLOCKED_TAGS.
+    Najprej poskusi hitro pot (scan_interesting_xml_fragments), sicer ElementTree.
     Zaenkrat vrne preprost tekstovni izpis.
     """
     import xml.etree.ElementTree as ET
 
-    try:
-        root = ET.fromstring(xml_text)
-    except ET.ParseError:
-        # če XML ni veljaven, vrnemo kar original
-        return xml_text
+    with open(src, "rb") as f:
+        fragments = scan_interesting_xml_fragments(f.read())
+    if fragments is None:
+        fragments = iter_interesting_xml_fragments(src)
 
-    lines: List[str] = []
+    try:
+        lines, found = collect_xml_fragments(fragments, file_ext)
+    except (ET.ParseError, LookupError):
+        # Bajti morda niso veljaven UTF-8 (npr. zalogaj cp1250 znaka v kodi)
+        # ali pa deklaracija navaja neznan encoding (LookupError), zato
+        # poskusimo še enkrat na dekodiranem tekstu.
+        xml_text = load_xml_text(src)
+        try:
+            lines, found = collect_xml_fragments(
+                iter_interesting_xml_fragments(io.StringIO(xml_text)), file_ext
+            )
+        except (ET.ParseError, LookupError):
+            # če XML ni veljaven, vrnemo kar original
+            return xml_text
 
-    # ElementTree v stdlib nima getparent, tako da bomo path gradili ročno
-    # z enostavno rekurzijo, kjer si zapomnimo pot.
-    def walk(elem, path_stack: List[str]):
-        local = get_local_tag(elem.tag)
-        path_stack.append(local)
-
-        # samo, če NI blokiran in če je tag "zanimiv"
-        if not is_blocked_tag(local, file_ext) and local in INTERESTING_XML_TAGS:
-            if local == "rawitemdata":
-                raw = (elem.text or "").strip()
-                if raw:
-                    decoded = decode_rawitemdata_base64(raw)
-                    if decoded is not None:
-                        stats["rawitemdata_text"] += 1
-                        lines.append(remove_empty_lines_normalized(decoded))
-                    else:
-                        stats["rawitemdata_binary_or_failed"] += 1
-                # če je prazno ali binarno, ne dodamo nič v lines
-            else:
-                text = (elem.text or "").strip()
-                if text:
-                    cleaned = remove_empty_lines_normalized(text)
-                    if cleaned:
-                        lines.append(cleaned)
-
-                        # NOVO: če je to <java> tag, preštej vrstice po čiščenju
-                        if local == "java":
-                            stats["java_lines"] += sum(
-                                1 for _ in cleaned.splitlines()
-                            )
-
-        # rekurzivno po otrocih
-        for child in list(elem):
-            walk(child, path_stack)
-
-        path_stack.pop()
-
-    walk(root, [])
+    merge_stats(stats, found)
 
     if not lines:
         # če ni nič zanimivega, se lahko vrne prazno ali fallback
@@ -339,24 +649,49 @@ def extract_interesting_xml_fragments(xml_text: str, file_ext: str, stats: Dict[
     return "\n".join(lines)
 
 
-def process_xml_file(src: str, dst: str, stats: Dict[str, int]) -> None:
+def count_data_lines(data: bytes) -> int:
+    """
+    Prešteje vrstice v `data` enako kot count_file_lines ('\n', '\r\n' in
+    samostojen '\r'; zadnja vrstica brez konca vrstice se šteje).
+    """
+    lines = data.count(b"\n") + data.count(b"\r") - data.count(b"\r\n")
+    if data and not data.endswith((b"\n", b"\r")):
+        lines += 1
+    return lines
+
+
+def write_export_file(dst: str, data: bytes, ext: str, stats: array, lines_by_ext: Dict[str, int]) -> None:
+    """
+    Zapiše izhodno datoteko in ob tem prešteje njene vrstice,
+    da print_sourceLineCount ne rabi ponovno brati export mape.
+    """
+    with open(dst, "wb") as f:
+        f.write(data)
+
+    line_count = count_data_lines(data)
+    stats[S_OUT_FILES] += 1
+    stats[S_OUT_LINES] += line_count
+    key = ext or "<noext>"
+    lines_by_ext[key] = lines_by_ext.get(key, 0) + line_count
+
+
+def process_xml_file(src: str, dst: str, ext: str, stats: array, lines_by_ext: Dict[str, int]) -> None:
     """
     Procesiranje XML datoteke:
-    - prebere XML
+    - sproti prebere XML
     - izlušči zanimive delčke (lotusscript, rawitemdata, ...)
     - upošteva blokiranje tagov
     - rezultat zapiše v `dst`
     """
-    xml_text = load_xml_text(src)
-    extracted = extract_interesting_xml_fragments(xml_text, os.path.splitext(src)[1], stats)
+    extracted = extract_interesting_xml_fragments(src, ext, stats)
 
     ensure_dir(os.path.dirname(dst))
 
     # Zaenkrat: če smo kaj dobili, zapišemo samo te delčke;
     # če ne, datoteka sploh ne nastane (prazno = brez datoteke).
+    # Kodiramo enkrat in pišemo binarno (brez text-mode encoderja in \r\n prevajanja).
     if extracted:
-        with open(dst, "w", encoding="utf-8", errors="replace") as f:
-            f.write(extracted)
+        write_export_file(dst, extracted.encode("utf-8", errors="replace"), ext, stats, lines_by_ext)
     #else:
         # fallback – če ni nič "zanimivega", lahko:
         # - zapišemo original
@@ -365,69 +700,82 @@ def process_xml_file(src: str, dst: str, stats: Dict[str, int]) -> None:
         #with open(dst, "w", encoding="utf-8", errors="replace") as f:
         #    f.write(xml_text)
 
-    stats["xml_files"] += 1
-    stats["processed_files"] += 1
+    stats[S_XML] += 1
+    stats[S_PROC] += 1
     return
 
 
-def process_plain_text_file(src: str, dst: str, stats: Dict[str, int]) -> None:
+def process_plain_text_file(src: str, dst: str, ext: str, stats: array, lines_by_ext: Dict[str, int]) -> None:
     """
     Obdelava navadne tekstovne datoteke (npr. .lss):
-    - prebere vsebino
+    - prebere vsebino (kot bajte; čisti ASCII brez dekodiranja)
     - normalizira in odstrani prazne vrstice
     - zapiše v `dst`
     """
     with open(src, "rb") as f:
         data = f.read()
-    try:
-        text = data.decode("utf-8")
-    except UnicodeDecodeError:
-        text = data.decode("latin1", errors="replace")
 
-    cleaned = remove_empty_lines_normalized(text)
+    cleaned = remove_empty_lines_bytes(data)
 
     ensure_dir(os.path.dirname(dst))
-    with open(dst, "w", encoding="utf-8", errors="replace") as f:
-        f.write(cleaned)
+    write_export_file(dst, cleaned, ext, stats, lines_by_ext)
 
-    stats["processed_files"] += 1
+    stats[S_PROC] += 1
 
 
 # ==========================
 # GLAVNO PROCESIRANJE POSAMEZNE DATOTEKE
 # ==========================
 
-def process_single_file(src: str, dst: str, stats: Dict[str, int]) -> None:
+# Usmerjanje po končnici: ena poizvedba v slovar pove, kaj naredimo z datoteko.
+# Ignorirane končnice so zadnje, da imajo prednost pred ostalimi.
+_DISPATCH: Dict[str, str] = {
+    **{e: "xml" for e in ZNANE_XML_DATOTEKE},
+    **{e: "text" for e in ALWAYS_PROCESS_AS_TEXT_EXTENSIONS},
+    **{e: "skip" for e in IGNORE_EXTENSIONS},
+}
+
+
+def process_single_file(src: str, dst: str, stats: array, lines_by_ext: Dict[str, int]) -> None:
     """Glavna funkcija za obdelavo ene datoteke."""
-    stats["total_files"] += 1
+    stats[S_TOTAL] += 1
 
-    _, ext = os.path.splitext(src)
-    ext = ext.lower()
+    # končnico izračunamo samo enkrat in jo podajamo naprej
+    ext = os.path.splitext(src)[1].lower()
+    action = _DISPATCH.get(ext)
 
     # 1) ignoriramo po končnici
-    if should_skip_by_extension(src):
-        stats["skipped_files"] += 1
-        stats["skipped_by_ext"] += 1
+    if action == "skip":
+        stats[S_SKIP] += 1
+        stats[S_SKIP_EXT] += 1
+        return
+
+    # 2) znana XML končnica – končnici zaupamo, headerja ne beremo
+    if action == "xml":
+        process_xml_file(src, dst, ext, stats, lines_by_ext)
         return
 
-    # 2) ignoriramo po headerju (magic bytes)
-    if should_skip_by_header(src):
-        stats["skipped_files"] += 1
-        stats["skipped_by_header"] += 1
+    # 3) posebne tekstovne datoteke (npr. .lss) – očisti prazne vrstice
+    if action == "text":
+        process_plain_text_file(src, dst, ext, stats, lines_by_ext)
         return
 
-    # 3) XML obdelava
-    if is_probably_xml(src):
-        process_xml_file(src, dst, stats)
+    # 4) neznana končnica: header preberemo enkrat in ga uporabimo za oboje
+    header = read_header(src, length=HEADER_LENGTH)
+
+    # ignoriramo po headerju (magic bytes)
+    if should_skip_by_header(header):
+        stats[S_SKIP] += 1
+        stats[S_SKIP_HDR] += 1
         return
 
-    # 4) posebne tekstovne datoteke (npr. .lss) – očisti prazne vrstice
-    if ext in ALWAYS_PROCESS_AS_TEXT_EXTENSIONS:
-        process_plain_text_file(src, dst, stats)
+    # vsebina izgleda kot XML
+    if is_probably_xml(header):
+        process_xml_file(src, dst, ext, stats, lines_by_ext)
         return
 
     # 5) vse ostalo (ne-XML in ne na seznamu za tekst) ne kopiramo več
-    stats["skipped_files"] += 1
+    stats[S_SKIP] += 1
     return
 
 
@@ -435,52 +783,90 @@ def process_single_file(src: str, dst: str, stats: Dict[str, int]) -> None:
 # STATISTIKA
 # ==========================
 
-def init_stats() -> Dict[str, int]:
-    """Inicializira slovar s statistiko."""
-    return {
-        "total_files": 0,
-        "processed_files": 0,
-        "skipped_files": 0,
-        "skipped_by_ext": 0,
-        "skipped_by_header": 0,
-        "xml_files": 0,
-        "rawitemdata_text": 0,
-        "rawitemdata_binary_or_failed": 0,
-        "java_lines": 0,   # NOVO: število vrstic Java kode (po čiščenju)
-    }
+# Indeksi v polju s statistiko
+(
+    S_TOTAL,        # skupaj datotek
+    S_PROC,         # obdelanih datotek
+    S_SKIP,         # preskočenih datotek
+    S_SKIP_EXT,     # preskočenih po končnici
+    S_SKIP_HDR,     # preskočenih po headerju
+    S_XML,          # XML datotek
+    S_RAW_TXT,      # rawitemdata dekodiranih v tekst
+    S_RAW_BIN,      # rawitemdata binarnih/neuspešnih
+    S_JAVA_LINES,   # NOVO: število vrstic Java kode (po čiščenju)
+    S_OUT_FILES,    # zapisanih datotek v export mapi
+    S_OUT_LINES,    # vrstic v zapisanih datotekah
+) = range(11)
+STATS_SIZE = S_OUT_LINES + 1
 
 
+def init_stats() -> array:
+    """Inicializira polje s statistiko (števci na fiksnih indeksih S_*)."""
+    return array("q", [0]) * STATS_SIZE
 
-def print_stats(stats: Dict[str, int]) -> None:
+
+def merge_stats(total: array, part: array) -> None:
+    """Prišteje statistiko `part` k `total`."""
+    for i, value in enumerate(part):
+        total[i] += value
+
+
+def merge_lines_by_ext(total: Dict[str, int], part: Dict[str, int]) -> None:
+    """Prišteje število vrstic po končnicah iz `part` k `total`."""
+    for ext, cnt in part.items():
+        total[ext] = total.get(ext, 0) + cnt
+
+
+def print_stats(stats: array) -> None:
     """Izpiše statistiko obdelave."""
     print("Tu bodo statistični rezultati.")
-    print(f"Skupaj datotek:                   {stats['total_files']}")
-    print(f"Obdelanih datotek:                {stats['processed_files']}")
-    print(f"Preskočenih:                      {stats['skipped_files']}")
-    print(f"  - po končnici:                  {stats['skipped_by_ext']}")
-    print(f"  - po headerju:                  {stats['skipped_by_header']}")
-    print(f"XML datotek:                      {stats['xml_files']}")
-    print(f"rawitemdata decodiranih v tekst:  {stats['rawitemdata_text']}")
-    print(f"rawitemdata binarnih/neuspešnih:  {stats['rawitemdata_binary_or_failed']}")
-    print(f"Vrstice Java kode (po čiščenju):  {stats['java_lines']}")
+    print(f"Skupaj datotek:                   {stats[S_TOTAL]}")
+    print(f"Obdelanih datotek:                {stats[S_PROC]}")
+    print(f"Preskočenih:                      {stats[S_SKIP]}")
+    print(f"  - po končnici:                  {stats[S_SKIP_EXT]}")
+    print(f"  - po headerju:                  {stats[S_SKIP_HDR]}")
+    print(f"XML datotek:                      {stats[S_XML]}")
+    print(f"rawitemdata decodiranih v tekst:  {stats[S_RAW_TXT]}")
+    print(f"rawitemdata binarnih/neuspešnih:  {stats[S_RAW_BIN]}")
+    print(f"Vrstice Java kode (po čiščenju):  {stats[S_JAVA_LINES]}")
 
 def count_file_lines(path: str) -> int:
     """
     Prešteje vrstice v datoteki.
-    Datoteko odpremo v tekstovnem načinu z utf-8 in ignoriramo
-    neveljavne znake, da se ne zaletimo na čudnih encodingih.
+    Datoteko beremo binarno v kosih – brez dekodiranja, zato nas čudni
+    encodingi ne motijo. Kot pri tekstovnem branju (universal newlines)
+    so konci vrstic '\n', '\r\n' in samostojen '\r'.
+    Zadnja vrstica brez konca vrstice se šteje.
     """
+    lines = 0
+    last = b""
     try:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            return sum(1 for _ in f)
+        with open(path, "rb", buffering=0) as f:
+            while chunk := f.read(COUNT_CHUNK_SIZE):
+                lines += chunk.count(b"\n") + chunk.count(b"\r") - chunk.count(b"\r\n")
+                # '\r\n', razdeljen med dva kosa, je en sam konec vrstice
+                if last.endswith(b"\r") and chunk.startswith(b"\n"):
+                    lines -= 1
+                last = chunk
     except OSError:
         # Če datoteke ne moremo prebrati, jo preskočimo
         return 0
 
+    if last and not last.endswith((b"\n", b"\r")):
+        lines += 1
+    return lines
 
-def print_sourceLineCount(export_root: str, statByExtension: bool) -> None:
+
+def print_sourceLineCount(
+    export_root: str,
+    statByExtension: bool,
+    stats: array | None = None,
+    lines_by_ext: Dict[str, int] | None = None,
+) -> None:
     """
-    Gre čez vse datoteke v export mapi in prešteje vrstice.
+    Izpiše število vrstic v export mapi. Če podamo `stats` in `lines_by_ext`
+    (vrstice, preštete ob pisanju), mape ne beremo še enkrat; sicer
+    (npr. za že obstoječ export) gre čez vse datoteke in prešteje vrstice.
     Izpiše:
       - skupno št. datotek
       - skupno št. vrstic
@@ -490,19 +876,21 @@ def print_sourceLineCount(export_root: str, statByExtension: bool) -> None:
         print(f"\nAnaliza vrstic: export mapa ne obstaja: {export_root}")
         return
 
-    total_files = 0
-    total_lines = 0
-    lines_by_ext: Dict[str, int] = {}
+    if stats is not None and lines_by_ext is not None:
+        total_files = stats[S_OUT_FILES]
+        total_lines = stats[S_OUT_LINES]
+    else:
+        total_files = 0
+        total_lines = 0
+        lines_by_ext = {}
 
-    for dirpath, dirnames, filenames in os.walk(export_root):
-        for filename in filenames:
-            full_path = os.path.join(dirpath, filename)
+        for _, entry in iter_tree_files(export_root):
             total_files += 1
 
-            _, ext = os.path.splitext(filename)
+            _, ext = os.path.splitext(entry.name)
             ext = ext.lower() if ext else "<noext>"
 
-            line_count = count_file_lines(full_path)
+            line_count = count_file_lines(entry.path)
             total_lines += line_count
             lines_by_ext[ext] = lines_by_ext.get(ext, 0) + line_count
 
@@ -531,11 +919,8 @@ def print_number_of_source_files(source_root: str) -> None:
             count = 0
         else:
             # samo datoteke v tej mapi, ne rekurzivno
-            count = sum(
-                1
-                for name in os.listdir(dir_path)
-                if os.path.isfile(os.path.join(dir_path, name))
-            )
+            with os.scandir(dir_path) as it:
+                count = sum(1 for entry in it if entry.is_file())
 
         print(f"{rel_subdir}: {count}")
 
@@ -543,6 +928,18 @@ def print_number_of_source_files(source_root: str) -> None:
 # GLAVNA FUNKCIJA
 # ==========================
 
+def process_batch(batch: List[Tuple[str, str]]) -> Tuple[array, Dict[str, int]]:
+    """
+    Obdela paket (src, dst) parov (v ločenem procesu) in vrne njegovo statistiko
+    ter število zapisanih vrstic po končnicah.
+    """
+    stats = init_stats()
+    lines_by_ext: Dict[str, int] = {}
+    for src_path, dst_path in batch:
+        process_single_file(src_path, dst_path, stats, lines_by_ext)
+    return stats, lines_by_ext
+
+
 def process_tree(source_root: str) -> None:
     """Obdela celo drevo map in datotek pod `source_root`."""
     source_root = os.path.abspath(source_root)
@@ -552,22 +949,31 @@ def process_tree(source_root: str) -> None:
     print(f"Izhodna mapa: {export_root}")
 
     stats = init_stats()
+    lines_by_ext: Dict[str, int] = {}
 
-    for dirpath, dirnames, filenames in os.walk(source_root):
-        rel_dir = get_rel_path(source_root, dirpath)
-        # ciljna mapa – enaka struktura kot izvor
-        if rel_dir == ".":
-            target_dir = export_root
-        else:
-            target_dir = os.path.join(export_root, rel_dir)
+    # ciljne poti – enaka struktura kot izvor
+    jobs = [
+        (entry.path, os.path.join(export_root, rel_dir, entry.name))
+        for rel_dir, entry in iter_tree_files(source_root)
+    ]
 
-        for filename in filenames:
-            src_path = os.path.join(dirpath, filename)
-            dst_path = os.path.join(target_dir, filename)
-            process_single_file(src_path, dst_path, stats)
+    workers = PARALLEL_WORKERS or os.cpu_count() or 1
+    if workers <= 1:
+        stats, lines_by_ext = process_batch(jobs)
+    else:
+        # datoteke so med sabo neodvisne, zato jih obdelamo v paketih po procesih
+        batches = [
+            jobs[i:i + PARALLEL_BATCH_SIZE]
+            for i in range(0, len(jobs), PARALLEL_BATCH_SIZE)
+        ]
+        # None prepustimo executorju (na Windows dovoli največ 61 procesov)
+        with ProcessPoolExecutor(max_workers=PARALLEL_WORKERS) as executor:
+            for part_stats, part_lines in executor.map(process_batch, batches):
+                merge_stats(stats, part_stats)
+                merge_lines_by_ext(lines_by_ext, part_lines)
 
     print_stats(stats)
-    print_sourceLineCount(build_export_root(source_root), statByExtension=False)
+    print_sourceLineCount(export_root, statByExtension=False, stats=stats, lines_by_ext=lines_by_ext)
     print_number_of_source_files(source_root)
 
 